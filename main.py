@@ -1,10 +1,18 @@
 from fastapi import FastAPI, Query
 from pydantic import BaseModel
 from datetime import datetime, timedelta, time
-from typing import List, Dict, Tuple, Optional, Union
-from fastapi.responses import JSONResponse
+from typing import List, Dict, Set, Tuple, Optional, Union
+from fastapi.responses import JSONResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
 import calendar
+import orjson
+from bisect import bisect_left
+from operator import itemgetter
+from threading import Lock
+from time import monotonic
+
+# Номер дня недели по его названию (Monday = 0)
+_DAY_NAME_TO_INT = {name: i for i, name in enumerate(calendar.day_name)}
 
 # Создаем приложение FastAPI
 app = FastAPI(
@@ -33,34 +41,48 @@ class StoreClosedError(Exception):
 
 # Класс магазина
 class Store:
+    __slots__ = ("code", "working_hours", "unloading_time", "special_schedules", "closed_dates", "_version")
+
     def __init__(self, code: str, working_hours: Dict[str, Tuple[int, int]], unloading_time: int):
         self.code = code
-        self.working_hours = working_hours
+        # Храним часы работы по номеру дня недели (Monday = 0) в виде готовых объектов time
+        self.working_hours = {_DAY_NAME_TO_INT[day]: (time(hours[0], 0), time(hours[1], 0))
+                              for day, hours in working_hours.items()}
         self.unloading_time = unloading_time
-        self.special_schedules = {}
+        # Особые графики и выходные даты хранятся по порядковому номеру даты
+        self.special_schedules: Dict[int, Tuple[time, time]] = {}
         self.closed_dates = set()
+        # Увеличивается при изменении выходных и особых графиков, входит в ключ кэша ответов
+        self._version = 0
 
     def add_special_schedule(self, date: str, hours: Tuple[int, int]):
-        self.special_schedules[date] = hours
+        date_ordinal = datetime.strptime(date, "%Y-%m-%d").toordinal()
+        self.special_schedules[date_ordinal] = (time(hours[0], 0), time(hours[1], 0))
+        self._version += 1
 
     def add_closed_date(self, date: str):
-        self.closed_dates.add(date)
+        self.closed_dates.add(datetime.strptime(date, "%Y-%m-%d").toordinal())
+        self._version += 1
 
     def is_open(self, date: datetime) -> bool:
-        date_str = date.strftime("%Y-%m-%d")
-        return date_str not in self.closed_dates
+        return date.toordinal() not in self.closed_dates
 
-    def get_working_hours(self, date: datetime) -> Optional[Tuple[int, int]]:
-        if not self.is_open(date):
+    def get_working_hours(self, date: datetime) -> Optional[Tuple[time, time]]:
+        return self._lookup_working_hours(date.toordinal())
+
+    def _lookup_working_hours(self, date_ordinal: int) -> Optional[Tuple[time, time]]:
+        if date_ordinal in self.closed_dates:
             return None
-        date_str = date.strftime("%Y-%m-%d")
-        if date_str in self.special_schedules:
-            return self.special_schedules[date_str]
-        day_name = calendar.day_name[date.weekday()]
-        return self.working_hours.get(day_name)
+        if date_ordinal in self.special_schedules:
+            return self.special_schedules[date_ordinal]
+        # ordinal 1 (0001-01-01) - понедельник
+        return self.working_hours.get((date_ordinal - 1) % 7)
 
 # Класс расписания доставки
 class DeliverySchedule:
+    __slots__ = ("store_code", "day_of_week", "frequency", "start_date", "departure_time",
+                 "travel_days", "arrival_time", "day_of_week_num", "_start_ordinal", "_first_departure_ordinal")
+
     def __init__(self, store_code: str, day_of_week: str, frequency: int, 
                  start_date: datetime, departure_time: time, 
                  travel_days: int, arrival_time: time):
@@ -71,41 +93,101 @@ class DeliverySchedule:
         self.departure_time = departure_time
         self.travel_days = travel_days
         self.arrival_time = arrival_time
-        self.day_of_week_num = list(calendar.day_name).index(day_of_week)
+        self.day_of_week_num = _DAY_NAME_TO_INT[day_of_week]
+        self._start_ordinal = start_date.toordinal()
+        # Первый день отправки не раньше start_date; далее отправки идут каждые 7 * frequency дней
+        self._first_departure_ordinal = self._start_ordinal + (self.day_of_week_num - (self._start_ordinal - 1)) % 7
+
+# Сколько дней вперед ищем отправки и на сколько дней строим индекс отправлений
+DELIVERY_SEARCH_DAYS = 60
+DEPARTURE_INDEX_DAYS = 365
 
 # Основная логика расчетов
 class LogisticsSystem:
+    __slots__ = ("stores", "delivery_schedules", "_last_arrival_by_weekday", "_arrivals_in_order",
+                 "_departure_index", "_sub_minute_departures", "order_processing_time", "_generation")
+
     def __init__(self, order_processing_time: int):
         self.stores: Dict[str, Store] = {}
         self.delivery_schedules: Dict[str, List[DeliverySchedule]] = {}
+        # Время прибытия последнего добавленного расписания магазина по номеру дня недели
+        self._last_arrival_by_weekday: Dict[str, Dict[int, time]] = {}
+        # True, если даты прибытия по расписаниям магазина получаются уже отсортированными
+        self._arrivals_in_order: Dict[str, bool] = {}
+        # Индекс отправлений магазина: (первый день, день после последнего, дни отправки, расписания)
+        self._departure_index: Dict[str, Tuple[int, int, List[int], List[DeliverySchedule]]] = {}
+        # Магазины, у которых есть рейсы с временем отправления не в целых минутах
+        self._sub_minute_departures: Set[str] = set()
         self.order_processing_time = order_processing_time
+        # Увеличивается при каждом изменении данных, чтобы сбросить кэш ответов
+        self._generation = 0
 
     def add_store(self, store: Store):
         self.stores[store.code] = store
+        self._generation += 1
 
     def add_delivery_schedule(self, schedule: DeliverySchedule):
-        self.delivery_schedules.setdefault(schedule.store_code, []).append(schedule)
+        store_schedules = self.delivery_schedules.setdefault(schedule.store_code, [])
+        last_arrivals = self._last_arrival_by_weekday.setdefault(schedule.store_code, {})
+        last_arrival = last_arrivals.get(schedule.day_of_week_num)
+        # При одинаковом времени в пути и неубывающем времени прибытия внутри дня
+        # даты прибытия идут в порядке обхода дней и сортировка не нужна
+        in_order = self._arrivals_in_order.get(schedule.store_code, True)
+        if store_schedules and schedule.travel_days != store_schedules[0].travel_days:
+            in_order = False
+        if last_arrival is not None and schedule.arrival_time < last_arrival:
+            in_order = False
+        self._arrivals_in_order[schedule.store_code] = in_order
+        store_schedules.append(schedule)
+        last_arrivals[schedule.day_of_week_num] = schedule.arrival_time
+        if schedule.departure_time.second or schedule.departure_time.microsecond:
+            self._sub_minute_departures.add(schedule.store_code)
+        self._departure_index.pop(schedule.store_code, None)
+        self._generation += 1
+
+    def _build_departure_index(self, store_code: str, start_ordinal: int) -> Tuple[int, int, List[int], List[DeliverySchedule]]:
+        # Все отправки магазина в окне [start_ordinal, end_ordinal), упорядоченные по дню,
+        # а внутри дня - по порядку добавления расписаний
+        end_ordinal = start_ordinal + DEPARTURE_INDEX_DAYS
+        departures = []
+        for schedule_idx, schedule in enumerate(self.delivery_schedules[store_code]):
+            step = 7 * schedule.frequency
+            first = schedule._first_departure_ordinal
+            if first < start_ordinal:
+                first += -(-(start_ordinal - first) // step) * step
+            for ordinal in range(first, end_ordinal, step):
+                departures.append((ordinal, schedule_idx, schedule))
+        departures.sort(key=itemgetter(0, 1))
+        index = (start_ordinal, end_ordinal, [d[0] for d in departures], [d[2] for d in departures])
+        self._departure_index[store_code] = index
+        return index
 
     def get_next_delivery_dates(self, store_code: str, from_date: datetime, count: int = 3) -> List[Tuple[DeliverySchedule, datetime]]:
         schedules = self.delivery_schedules.get(store_code)
         if not schedules:
             raise NoDeliveryScheduleError("No delivery schedule found for this store.")
+        from_ordinal = from_date.toordinal()
+        from_time = from_date.time()
+        end_ordinal = from_ordinal + DELIVERY_SEARCH_DAYS
+        # Индекс перестраивается, только когда период поиска выходит за его границы
+        index = self._departure_index.get(store_code)
+        if index is None or from_ordinal < index[0] or end_ordinal > index[1]:
+            index = self._build_departure_index(store_code, from_ordinal)
+        _, _, ordinals, departing = index
         delivery_dates = []
-        current_date = from_date
-        while len(delivery_dates) < count and (current_date - from_date).days < 60:
-            for schedule in schedules:
-                if current_date.weekday() == schedule.day_of_week_num:
-                    weeks_diff = ((current_date - schedule.start_date).days // 7)
-                    if weeks_diff % schedule.frequency == 0 and current_date >= schedule.start_date:
-                        if current_date.date() == from_date.date() and schedule.departure_time < from_date.time():
-                            continue
-                        arrival_date = current_date + timedelta(days=schedule.travel_days)
-                        arrival_datetime = datetime.combine(arrival_date.date(), schedule.arrival_time)
-                        delivery_dates.append((schedule, arrival_datetime))
-                        if len(delivery_dates) >= count:
-                            break
-            current_date += timedelta(days=1)
-        return sorted(delivery_dates, key=lambda x: x[1])
+        for i in range(bisect_left(ordinals, from_ordinal), bisect_left(ordinals, end_ordinal)):
+            if len(delivery_dates) >= count:
+                break
+            ordinal = ordinals[i]
+            schedule = departing[i]
+            # В день начала поиска учитываем только ещё не ушедшие рейсы
+            if ordinal == from_ordinal and schedule.departure_time < from_time:
+                continue
+            arrival_date = datetime.fromordinal(ordinal + schedule.travel_days)
+            delivery_dates.append((schedule, datetime.combine(arrival_date, schedule.arrival_time)))
+        if not self._arrivals_in_order[store_code]:
+            delivery_dates.sort(key=itemgetter(1))
+        return delivery_dates
 
     def get_pickup_times(self, store_code: str, delivery_datetime: datetime) -> Optional[Tuple[datetime, datetime]]:
         store = self.stores.get(store_code)
@@ -113,25 +195,23 @@ class LogisticsSystem:
             raise StoreNotFoundError("Store not found.")
         unloading_time_delta = timedelta(minutes=store.unloading_time)
         available_time = delivery_datetime + unloading_time_delta
-        working_hours = store.get_working_hours(available_time.date())
+        avail_d = available_time.date()
+        avail_t = available_time.time()
+        working_hours = store.get_working_hours(avail_d)
         if not working_hours:
             raise StoreClosedError("Store is closed on delivery date.")
-        opening_time = time(working_hours[0], 0)
-        closing_time = time(working_hours[1], 0)
-        if available_time.time() >= closing_time:
-            next_day = available_time.date() + timedelta(days=1)
+        opening_time, closing_time = working_hours
+        if avail_t < opening_time:
+            return (datetime.combine(avail_d, opening_time), datetime.combine(avail_d, closing_time))
+        if avail_t >= closing_time:
+            next_day = avail_d + timedelta(days=1)
             next_day_hours = store.get_working_hours(next_day)
             if not next_day_hours:
                 raise StoreClosedError("Store is closed on the next day after delivery.")
-            start_time = datetime.combine(next_day, time(next_day_hours[0], 0))
-            end_time = datetime.combine(next_day, time(next_day_hours[1], 0))
+            start_time = datetime.combine(next_day, next_day_hours[0])
+            end_time = datetime.combine(next_day, next_day_hours[1])
             return (start_time, end_time)
-        if available_time.time() < opening_time:
-            start_time = datetime.combine(available_time.date(), opening_time)
-        else:
-            start_time = available_time
-        end_time = datetime.combine(available_time.date(), closing_time)
-        return (start_time, end_time)
+        return (available_time, datetime.combine(avail_d, closing_time))
 
     def get_delivery_dates(self, store_code: str, order_date: datetime, days_to_show: int = 5) -> Dict[str, Union[List[Dict], Dict]]:
         store = self.stores.get(store_code)
@@ -158,17 +238,19 @@ class LogisticsSystem:
                 continue
                 
             start_time, end_time = pickup_times
-            date_str = start_time.strftime("%Y-%m-%d")
+            date_str = f"{start_time.year}-{start_time.month:02d}-{start_time.day:02d}"
             
             if date_str in seen_dates:
                 continue
                 
             seen_dates.add(date_str)
+            start_str = f"{start_time.hour:02d}:{start_time.minute:02d}"
+            end_str = f"{end_time.hour:02d}:{end_time.minute:02d}"
             
             result.append({
                 "date": date_str,
-                "time_range": [start_time.strftime("%H:%M"), end_time.strftime("%H:%M")],
-                "formatted": f"{date_str} from {start_time.strftime('%H:%M')} to {end_time.strftime('%H:%M')}"
+                "time_range": [start_str, end_str],
+                "formatted": f"{date_str} from {start_str} to {end_str}"
             })
             
             if len(result) >= days_to_show:
@@ -228,9 +310,43 @@ schedule2 = DeliverySchedule(
 logistics_system.add_delivery_schedule(schedule1)
 logistics_system.add_delivery_schedule(schedule2)
 
+# Кэш ответов эндпоинта: (код магазина, минута заказа, поколение данных) -> (срок годности, ответ)
+RESPONSE_CACHE_TTL = 30
+RESPONSE_CACHE_MAXSIZE = 1024
+_response_cache: Dict[Tuple, Tuple[float, Dict]] = {}
+_response_cache_lock = Lock()
+
+def _get_cached_response(key: Tuple) -> Optional[Dict]:
+    with _response_cache_lock:
+        cached = _response_cache.get(key)
+        if cached is None:
+            return None
+        expires_at, response = cached
+        if expires_at <= monotonic():
+            del _response_cache[key]
+            return None
+        return response
+
+def _store_cached_response(key: Tuple, response: Dict):
+    with _response_cache_lock:
+        if len(_response_cache) >= RESPONSE_CACHE_MAXSIZE:
+            now = monotonic()
+            for expired_key in [k for k, (expires_at, _) in _response_cache.items() if expires_at <= now]:
+                del _response_cache[expired_key]
+            if len(_response_cache) >= RESPONSE_CACHE_MAXSIZE:
+                # Удаляем самую старую запись
+                del _response_cache[next(iter(_response_cache))]
+        _response_cache[key] = (monotonic() + RESPONSE_CACHE_TTL, response)
+
+# Сериализуем ответ через orjson, он быстрее стандартной сериализации FastAPI
+def _json_response(content: Dict) -> Response:
+    return Response(content=orjson.dumps(content), media_type="application/json")
+
 # API Endpoint
-@app.get("/delivery_times/", response_model=DeliveryResult)
-def get_delivery_times(
+# Ответ собирается вручную и совпадает с DeliveryResult, поэтому модель
+# используется только для документации OpenAPI, без повторной валидации
+@app.get("/delivery_times/", response_model=None, responses={200: {"model": DeliveryResult}})
+async def get_delivery_times(
     store_code: str = Query(..., description="Код магазина"),
     order_date: Optional[datetime] = Query(None, description="Дата и время заказа (формат: YYYY-MM-DDTHH:MM)")
 ):
@@ -239,13 +355,27 @@ def get_delivery_times(
     """
     if order_date is None:
         order_date = datetime.now()
+    # Округляем заказ вверх до минуты, чтобы ответ можно было кэшировать. Если все рейсы
+    # магазина отправляются в целые минуты, ушедшие рейсы отсекаются так же, как по точному
+    # времени; иначе считаем по точному времени заказа
+    if ((order_date.second or order_date.microsecond)
+            and store_code not in logistics_system._sub_minute_departures):
+        order_date = order_date.replace(second=0, microsecond=0) + timedelta(minutes=1)
+    # Версия магазина в ключе сбрасывает кэш после изменения выходных и особых графиков
+    store = logistics_system.stores.get(store_code)
+    cache_key = (store_code, order_date, logistics_system._generation, store._version if store else None)
+    response = _get_cached_response(cache_key)
+    if response is not None:
+        return _json_response(response)
     result = logistics_system.get_delivery_dates(store_code, order_date)
     if "dates" in result:
-        return {"dates": result["dates"], "error": None}
+        response = {"dates": result["dates"], "error": None}
     else:
-        return {"dates": [], "error": result["error"]}
+        response = {"dates": [], "error": result["error"]}
+    _store_cached_response(cache_key, response)
+    return _json_response(response)
 
 # Дополнительный эндпоинт с корректной кодировкой
 @app.get("/")
-def read_root():
+async def read_root():
     return {"message": "Welcome to Delivery Time API! Go to /docs for documentation."}
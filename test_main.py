@@ -0,0 +1,122 @@
+from datetime import datetime, time, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+
+client = TestClient(main.app)
+
+
+@pytest.fixture(autouse=True)
+def clear_response_cache():
+    main._response_cache.clear()
+    yield
+    main._response_cache.clear()
+
+
+def make_logistics_system(departure_time: time = time(8, 0)) -> main.LogisticsSystem:
+    system = main.LogisticsSystem(order_processing_time=60)
+    system.add_store(main.Store(
+        code="TEST",
+        working_hours={day: (10, 20) for day in ["Monday", "Tuesday", "Wednesday", "Thursday",
+                                                 "Friday", "Saturday", "Sunday"]},
+        unloading_time=120
+    ))
+    system.add_delivery_schedule(main.DeliverySchedule(
+        store_code="TEST",
+        day_of_week="Monday",
+        frequency=1,
+        start_date=datetime(2024, 6, 1),
+        departure_time=departure_time,
+        travel_days=2,
+        arrival_time=time(9, 0)
+    ))
+    return system
+
+
+def get_dates(store_code: str, order_date: str):
+    response = client.get("/delivery_times/", params={"store_code": store_code, "order_date": order_date})
+    assert response.status_code == 200
+    return [item["date"] for item in response.json()["dates"]]
+
+
+def test_order_just_after_cutoff_skips_departed_truck():
+    # Заказ готов в 08:00:30, понедельничный рейс в 08:00 уже ушел
+    assert get_dates("STORE001", "2024-07-01T07:00:30")[0] == "2024-07-05"
+    assert get_dates("STORE001", "2024-07-01T07:00:00")[0] == "2024-07-03"
+
+
+def test_closed_date_invalidates_cached_response(monkeypatch):
+    system = make_logistics_system()
+    monkeypatch.setattr(main, "logistics_system", system)
+    assert get_dates("TEST", "2024-07-01T06:00")[0] == "2024-07-03"
+    system.stores["TEST"].add_closed_date("2024-07-03")
+    assert get_dates("TEST", "2024-07-01T06:00")[0] == "2024-07-10"
+
+
+def test_sub_minute_departure_is_not_dropped_by_rounding(monkeypatch):
+    monkeypatch.setattr(main, "logistics_system", make_logistics_system(departure_time=time(8, 0, 45)))
+    # Заказ готов в 08:00:30, рейс в 08:00:45 еще не ушел
+    assert get_dates("TEST", "2024-07-01T07:00:30")[0] == "2024-07-03"
+    assert get_dates("TEST", "2024-07-01T07:00:50")[0] == "2024-07-10"
+
+
+def make_schedule(day_of_week: str, start_date: datetime, frequency: int = 1,
+                  travel_days: int = 0, arrival_time: time = time(9, 0)) -> main.DeliverySchedule:
+    return main.DeliverySchedule(
+        store_code="TEST",
+        day_of_week=day_of_week,
+        frequency=frequency,
+        start_date=start_date,
+        departure_time=time(8, 0),
+        travel_days=travel_days,
+        arrival_time=arrival_time
+    )
+
+
+def next_arrivals(system: main.LogisticsSystem, from_date: datetime, count: int):
+    return [arrival for _, arrival in system.get_next_delivery_dates("TEST", from_date, count)]
+
+
+def test_biweekly_schedule_counts_weeks_from_midweek_start_date():
+    system = main.LogisticsSystem(order_processing_time=0)
+    # Старт в среду 2024-06-05, рейсы по понедельникам раз в две недели
+    system.add_delivery_schedule(make_schedule("Monday", datetime(2024, 6, 5), frequency=2))
+    assert next_arrivals(system, datetime(2024, 6, 1), 3) == [
+        datetime(2024, 6, 10, 9, 0),
+        datetime(2024, 6, 24, 9, 0),
+        datetime(2024, 7, 8, 9, 0),
+    ]
+    assert next_arrivals(system, datetime(2024, 6, 11), 1) == [datetime(2024, 6, 24, 9, 0)]
+
+
+def test_departure_index_is_rebuilt_outside_its_window():
+    system = main.LogisticsSystem(order_processing_time=0)
+    system.add_delivery_schedule(make_schedule("Monday", datetime(2020, 1, 1)))
+    assert next_arrivals(system, datetime(2024, 6, 1), 1) == [datetime(2024, 6, 3, 9, 0)]
+    first_index = system._departure_index["TEST"]
+    assert first_index[0] == datetime(2024, 6, 1).toordinal()
+
+    # Период поиска заканчивается после конца индекса
+    late_date = datetime.fromordinal(first_index[1] - 10)
+    late_arrivals = next_arrivals(system, late_date, 2)
+    assert system._departure_index["TEST"][0] == late_date.toordinal()
+    assert all(arrival.weekday() == 0 and arrival >= late_date for arrival in late_arrivals)
+    assert late_arrivals[1] - late_arrivals[0] == timedelta(days=7)
+
+    # Период поиска начинается раньше индекса
+    assert next_arrivals(system, datetime(2024, 5, 1), 1) == [datetime(2024, 5, 6, 9, 0)]
+    assert system._departure_index["TEST"][0] == datetime(2024, 5, 1).toordinal()
+
+
+def test_arrivals_are_sorted_when_travel_days_differ():
+    system = main.LogisticsSystem(order_processing_time=0)
+    system.add_delivery_schedule(make_schedule("Monday", datetime(2024, 6, 1), travel_days=3))
+    system.add_delivery_schedule(make_schedule("Tuesday", datetime(2024, 6, 1), arrival_time=time(10, 0)))
+    assert not system._arrivals_in_order["TEST"]
+    assert next_arrivals(system, datetime(2024, 7, 1), 3) == [
+        datetime(2024, 7, 2, 10, 0),
+        datetime(2024, 7, 4, 9, 0),
+        datetime(2024, 7, 11, 9, 0),
+    ]